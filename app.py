@@ -1,7 +1,23 @@
 import streamlit as st
 from streamlit.components.v1 import html as st_html
 import pandas as pd
+import numpy as np
+import base64
+import io
+import json
+import math
 import re
+import warnings
+
+try:
+    import orjson  # optional: serializes NumPy columns directly
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow.csv as pa_csv  # optional (ships with streamlit): multithreaded CSV reader
+except ImportError:
+    pa_csv = None
 
 st.set_page_config(page_title="Lightning — Fixed Area", layout="wide")
 st.markdown("#### HLMA Website")
@@ -22,107 +38,174 @@ with col2:
     )
 
 # ─────────────────────── Helpers & Normalizers ───────────────────────
-def _find_col(cols, aliases):
-    lower = {c.lower(): c for c in cols}
+def _find_col(lower, aliases):
+    """First column whose lowercased name is in aliases (lowercase, in priority order)."""
     for a in aliases:
-        if a.lower() in lower:
-            return lower[a.lower()]
+        if a in lower:
+            return lower[a]
     return None
 
-def _is_float_token(t: str) -> bool:
-    return re.fullmatch(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?", (t or "").strip()) is not None
-
-def parse_lma_dat(file) -> pd.DataFrame | None:
-    """
-    Heuristic parser for HLMA/LMA .dat exports.
-    - Reads bytes once (file.getvalue()), decodes (ascii→utf-8 fallback)
-    - Keeps lines that begin with a number and contain >=4 numeric tokens
-    - Infers lat, lon, alt (m), and optional time column
-    """
-    if not file:
+def _to_float_or_none(t: str | bytes) -> float | None:
+    try:
+        v = float(t)
+    except (TypeError, ValueError):
         return None
+    # float() also takes "nan"/"inf" and "1_000"; none of those count as numeric tokens here
+    if not math.isfinite(v) or (b"_" if isinstance(t, bytes) else "_") in t:
+        return None
+    return v
+
+def _is_float_token(t: str | bytes) -> bool:
+    # float() runs CPython's C parser (bytes tokens included); much cheaper than a regex fullmatch per token
+    return _to_float_or_none(t) is not None
+
+def _is_data_line(ln: bytes) -> bool:
+    toks = ln.split()
+    if len(toks) < 4 or not _is_float_token(toks[0]):
+        return False
+    return len(toks) - [_to_float_or_none(t) for t in toks].count(None) >= 4
+
+# LMA headers (station table, flash-algorithm notes) are a few KB; a file with no data
+# line this far in is not a .dat export, so don't walk the rest of it
+_HEADER_SCAN_BYTES = 1 << 18
+
+def _find_data_start(raw: bytes) -> int | None:
+    """Byte offset of the first data line (everything before it is the .dat header)."""
+    pos = 0
+    while pos < min(len(raw), _HEADER_SCAN_BYTES):
+        end = raw.find(b"\n", pos)
+        end = len(raw) if end < 0 else end + 1
+        if _is_data_line(raw[pos:end]):
+            return pos
+        pos = end
+    return None
 
-    raw = file.getvalue()  # <- robust for Streamlit reruns
-    try:
-        text = raw.decode("ascii", errors="replace")
-    except Exception:
-        text = raw.decode("utf-8", errors="replace")
-
-    rows = []
-    for ln in text.splitlines():
-        s = ln.strip()
-        if not s:
-            continue
-        toks = s.split()
+def _tokenize_numeric_rows(text: str) -> pd.DataFrame | None:
+    """Pure-Python fallback for bodies the C tokenizer rejects (ragged/odd layouts)."""
+    lines = text.splitlines()
+    # rows are written straight into a NaN-filled float matrix (one row per line at most);
+    # the width grows only if a wider row turns up
+    arr = np.full((len(lines), 16), np.nan)
+    n = max_cols = 0
+    for ln in lines:
+        toks = ln.split()
         if len(toks) < 4:
             continue
-        if not _is_float_token(toks[0]):
+        # one float() per token; non-numeric tokens stay None (NaN in the matrix)
+        row = [_to_float_or_none(t) for t in toks]
+        if row[0] is None:
             continue  # header/comment lines
-        num_toks = [t for t in toks if _is_float_token(t)]
-        if len(num_toks) < 4:
+        if len(row) - row.count(None) < 4:
             continue
-        # keep as floats where possible
-        row = []
-        for t in toks:
-            if _is_float_token(t):
-                try:
-                    row.append(float(t))
-                except Exception:
-                    row.append(None)
-            else:
-                row.append(None)
-        rows.append(row)
-
-    if not rows:
-        st.error("No numeric data rows detected in the .dat file. If your .dat is fixed-width or different schema, I can add a manual column mapper.")
+        if len(row) > arr.shape[1]:
+            arr = np.hstack([arr, np.full((arr.shape[0], len(row) - arr.shape[1]), np.nan)])
+        arr[n, :len(row)] = row
+        n += 1
+        max_cols = max(max_cols, len(row))
+
+    if not n:
+        return None
+    return pd.DataFrame(arr[:n, :max_cols], columns=[f"c{i+1}" for i in range(max_cols)])
+
+# columns allowed past the first data line's width; a wider row sends the body to the fallback
+_EXTRA_COLS = 8
+
+def _read_numeric_table(raw: bytes, start: int) -> pd.DataFrame | None:
+    """
+    Bulk-parse the whitespace-separated body (raw from byte offset start) with
+    pandas' C tokenizer into a float64 table. Non-numeric and non-finite tokens
+    (e.g. hex station masks, "inf") become NaN; rows that don't start with a
+    number or carry <4 numeric values are dropped, matching the line filter of
+    the Python fallback.
+    """
+    end = raw.find(b"\n", start)
+    width = len(raw[start:end if end >= 0 else len(raw)].split()) + _EXTRA_COLS
+    buf = io.BytesIO(raw)  # shares raw's memory until written to
+    buf.seek(start)
+    try:
+        # fixed width: rows narrower than it are NaN-padded, wider ones raise instead of being skipped
+        df = pd.read_csv(buf, sep=r"\s+", header=None, names=range(width), index_col=False,
+                         engine="c", encoding="latin-1", low_memory=False)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError):
+        return _tokenize_numeric_rows(str(memoryview(raw)[start:], "ascii", "replace"))
+
+    has_token = df.notna().any().to_numpy()
+    if not has_token.any():
+        return None
+    df = df.iloc[:, :np.flatnonzero(has_token)[-1] + 1]  # drop the padding columns no row reached
+    for c in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    arr = df.to_numpy(dtype=np.float64)
+    arr[~np.isfinite(arr)] = np.nan
+    arr = arr[~np.isnan(arr[:, 0]) & ((~np.isnan(arr)).sum(axis=1) >= 4)]
+    if not len(arr):
         return None
+    return pd.DataFrame(arr, columns=[f"c{i+1}" for i in range(arr.shape[1])])
 
-    max_cols = max(len(r) for r in rows)
-    rows = [r + [None]*(max_cols - len(r)) for r in rows]
-    df = pd.DataFrame(rows, columns=[f"c{i+1}" for i in range(max_cols)])
+def parse_lma_dat(file) -> pd.DataFrame | None:
+    """Parse an uploaded .dat; results are cached on the file bytes across reruns."""
+    if not file:
+        return None
+    return _parse_lma_dat_bytes(file.getvalue())  # <- robust for Streamlit reruns
 
-    # inference helpers
-    def in_range(series, lo, hi, min_ratio=0.9):
-        s = pd.to_numeric(series, errors="coerce").dropna()
-        if s.empty: return False
-        return (s.between(lo, hi).mean() >= min_ratio) and (s.std() > 1e-6)
+# rows profiled for lat/lon/alt/time inference; a few thousand are plenty to pick columns
+_INFER_ROWS = 20000
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _parse_lma_dat_bytes(raw: bytes) -> pd.DataFrame | None:
+    """
+    Heuristic parser for HLMA/LMA .dat exports.
+    - Takes the raw upload bytes (never decoded as a whole)
+    - Skips the header block, bulk-parses the numeric body (C tokenizer)
+    - Keeps lines that begin with a number and contain >=4 numeric tokens
+    - Infers lat, lon, alt (m), and optional time column
+    """
+    start = _find_data_start(raw)
+    df = _read_numeric_table(raw, start) if start is not None else None
+    if df is None:
+        st.error("No numeric data rows detected in the .dat file. If your .dat is fixed-width or different schema, I can add a manual column mapper.")
+        return None
 
-    lat_cands = [c for c in df.columns if in_range(df[c], -90, 90)]
-    lon_cands = [c for c in df.columns if in_range(df[c], -180, 180)]
+    # per-column summary, computed once and shared by every heuristic below; only the
+    # first _INFER_ROWS rows are profiled, the chosen columns are then read from the full table
+    cols = df.columns
+    arr = df.to_numpy(dtype=np.float64)
+    head = arr[:_INFER_ROWS]
+    n_valid = (~np.isnan(head)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN / single-value columns
+        frac_lat = ((head >= -90) & (head <= 90)).sum(axis=0) / n_valid
+        frac_lon = ((head >= -180) & (head <= 180)).sum(axis=0) / n_valid
+        frac_pos = (head > 0).sum(axis=0) / n_valid
+        col_std = np.nanstd(head, axis=0, ddof=1)
+        col_med = np.nanmedian(head, axis=0)
+
+    varies = col_std > 1e-6
+    lat_cands = list(cols[(frac_lat >= 0.9) & varies])
+    lon_cands = list(cols[(frac_lon >= 0.9) & varies])
 
     lat_col = lat_cands[0] if lat_cands else None
     lon_col = lon_cands[0] if lon_cands else None
 
-    # altitude candidates: mostly positive
-    alt_cols = []
-    for c in df.columns:
-        s = pd.to_numeric(df[c], errors="coerce").dropna()
-        if not s.empty and (s > 0).mean() >= 0.95:
-            alt_cols.append(c)
-
-    def alt_score(series):
-        s = pd.to_numeric(series, errors="coerce").dropna()
-        if s.empty: return 0
-        med = s.median()
-        if 50 <= med <= 30000: return 2  # meters
-        if 0.05 <= med <= 50:  return 1  # likely km
-        return 0
-
-    best = (-1, None)
-    for c in alt_cols:
-        sc = alt_score(df[c])
-        if sc > best[0]:
-            best = (sc, c)
-    alt_col = best[1]
+    # altitude candidates: mostly positive; prefer medians that look like m, then km
+    is_alt = frac_pos >= 0.95
+    alt_cols = list(cols[is_alt])
+    alt_score = np.select(
+        [(col_med >= 50) & (col_med <= 30000), (col_med >= 0.05) & (col_med <= 50)],
+        [2, 1], 0,
+    )
+    alt_score = np.where(is_alt, alt_score, -1)
+    alt_j = int(np.argmax(alt_score))
+    alt_col = cols[alt_j] if alt_cols else None
 
     # time: roughly non-decreasing sequence
     time_col, best_time_score = None, -1
-    for c in df.columns:
-        s = pd.to_numeric(df[c], errors="coerce").dropna()
-        if len(s) < 10: continue
-        diffs = s.diff().dropna()
-        if len(diffs) == 0: continue
-        inc_ratio = (diffs >= 0).mean()
+    for j, c in enumerate(cols):
+        if n_valid[j] < 10: continue
+        s = head[:, j]
+        s = s[~np.isnan(s)] if n_valid[j] < len(s) else s
+        inc_ratio = (np.diff(s) >= 0).mean()
         if inc_ratio > best_time_score and inc_ratio >= 0.6:
             best_time_score, time_col = inc_ratio, c
 
@@ -130,38 +213,104 @@ def parse_lma_dat(file) -> pd.DataFrame | None:
         st.error(f"Failed to infer columns.\nLat candidates: {lat_cands}\nLon candidates: {lon_cands}\nAlt candidates: {alt_cols}")
         return None
 
+    # one pass: keep rows with finite lat/lon/alt, then convert km→m in place when the
+    # classifier scored the altitude median as km (score 1) — no second scan of the column
+    lat, lon, alt = arr[:, cols.get_loc(lat_col)], arr[:, cols.get_loc(lon_col)], arr[:, cols.get_loc(alt_col)]
+    keep = np.isfinite(lat) & np.isfinite(lon) & np.isfinite(alt)
+    lat, lon, alt = lat[keep], lon[keep], alt[keep]
+    if alt_score[alt_j] == 1:
+        np.multiply(alt, 1000.0, out=alt)
+    # float32 is what the page receives anyway; tier and weight use the float64 alt. At these
+    # coordinates float32 steps are ~2e-6 deg in lat and ~8e-6 deg in lon (up to ~0.8 m), and
+    # ~0.002 m in alt, so lat/lon carry about 5 good decimals (the CSV export writes 5)
     out = pd.DataFrame({
-        "lat": pd.to_numeric(df[lat_col], errors="coerce"),
-        "lon": pd.to_numeric(df[lon_col], errors="coerce"),
-        "alt": pd.to_numeric(df[alt_col], errors="coerce"),
-    }).dropna(subset=["lat", "lon", "alt"])
-
-    # convert km→m if most altitudes < 50
-    s_alt = out["alt"].dropna()
-    if not s_alt.empty and (s_alt < 50).mean() >= 0.8:
-        out["alt"] = out["alt"] * 1000.0
-
-    out["time"] = df[time_col].astype(str) if time_col else ""
+        "lat": lat.astype(np.float32), "lon": lon.astype(np.float32), "alt": alt.astype(np.float32),
+        # altitude tier 0..3 (<12, 12–14, 14–16, >16 km), shared by markers, legend counts and filters
+        "tier": np.digitize(alt, [12000.0, 14000.0, 16000.0]).astype(np.int8),
+        # heatmap intensity: 0.5 at/below 10 km ramping to 1.5 at 18 km
+        "w": (np.clip((alt - 10000.0) / 8000.0, 0.0, 1.0) + 0.5).astype(np.float32),
+    })
+    if time_col:  # no column at all otherwise; the page treats a missing time as untimed
+        out["time"] = df[time_col][keep].astype(str).to_numpy()
     return out
 
 def parse_wind_csv(file):
     if not file:
         return None
-    df = pd.read_csv(file)
-    lat_c = _find_col(df.columns, ["Lat", "Latitude", "lat", "latitude", "y"])
-    lon_c = _find_col(df.columns, ["Lon", "Longitude", "lon", "longitude", "x"])
-    com_c = _find_col(df.columns, ["Comments", "Comment", "Remark", "Remarks", "Desc", "Description"])
-    time_c = _find_col(df.columns, ["Time", "Valid", "IssueTime", "Date", "Datetime", "timestamp", "time"])
+    return _parse_wind_csv_bytes(file.getvalue())
+
+def _read_wind_table(raw: bytes, num_cols: list, str_cols: list) -> pd.DataFrame:
+    """
+    Read only num_cols + str_cols of the report CSV with pyarrow's multithreaded reader,
+    typing num_cols as float and str_cols as raw strings up front (no timestamp or number
+    inference, so "0930" stays "0930"; empty cells stay ""). pyarrow refuses non-numeric
+    cells in a float column, so such files fall back to the C engine with a per-column
+    coercion (callers render its NaN text cells with _text_col).
+    """
+    usecols, str_dtype = [*num_cols, *str_cols], {c: str for c in str_cols}
+    try:
+        if pa_csv is None:
+            raise ImportError("pyarrow")
+        types = {**{c: "float64" for c in num_cols}, **{c: "string" for c in str_cols}}
+        opts = pa_csv.ConvertOptions(include_columns=usecols, column_types=types)
+        return pa_csv.read_csv(io.BytesIO(raw), convert_options=opts).to_pandas()
+    except (ImportError, ValueError):
+        df = pd.read_csv(io.BytesIO(raw), usecols=usecols, dtype=str_dtype, low_memory=False)
+        for c in num_cols:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+        return df
+
+def _text_col(s: pd.Series) -> pd.Series:
+    """Column as display text; nulls (None/NaN) become "" rather than "None"/"nan"."""
+    return s.astype(object).where(s.notna(), "").astype(str)
+
+# US zone abbreviations as fixed offsets, the way the browser's Date reads "10:00 CDT"
+_US_ZONES = {"EST": "-05:00", "EDT": "-04:00", "CST": "-06:00", "CDT": "-05:00",
+             "MST": "-07:00", "MDT": "-06:00", "PST": "-08:00", "PDT": "-07:00",
+             "UTC": "+00:00", "GMT": "+00:00", "UT": "+00:00"}
+_ZONE_ABBR = re.compile(r"\s*\b(" + "|".join(_US_ZONES) + r")$", re.IGNORECASE)
+_ZONED = re.compile(r"(?:Z|[+-]\d{2}:?\d{2}|\b(?:" + "|".join(_US_ZONES) + r"))$", re.IGNORECASE)
+
+def _report_times_ms(text: pd.Series) -> pd.Series:
+    """
+    Epoch ms for report times that pin their own instant: epoch-ms numbers (> 1e10),
+    stamps ending in Z/±hh:mm, and US zone abbreviations ("2024-07-08 10:00 CDT").
+    Everything else (naive or date-less, e.g. SPC "HHMM") is NaN and left to the
+    page's parseTime, which reads it in the browser's zone as it always has.
+    """
+    s = text.str.strip()
+    num = pd.to_numeric(s, errors="coerce")
+    zoned = num.isna() & s.str.contains(_ZONED)
+    s = s.where(zoned).str.replace(_ZONE_ABBR, lambda m: " " + _US_ZONES[m.group(1).upper()], regex=True)
+    t = pd.to_datetime(s, errors="coerce", utc=True, format="mixed")
+    ms = (t.dt.tz_convert(None) - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+    return ms.where(~(num > 1e10), num.round())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _parse_wind_csv_bytes(raw: bytes):
+    header = pd.read_csv(io.BytesIO(raw), nrows=0).columns  # resolve aliases before the full read
+    lower = {c.lower(): c for c in header}
+    lat_c = _find_col(lower, ("lat", "latitude", "y"))
+    lon_c = _find_col(lower, ("lon", "longitude", "x"))
+    com_c = _find_col(lower, ("comments", "comment", "remark", "remarks", "desc", "description"))
+    time_c = _find_col(lower, ("time", "valid", "issuetime", "date", "datetime", "timestamp"))
     if not (lat_c and lon_c):
         st.error("Storm report CSV is missing Lat/Lon; please include those.")
         return None
+    df = _read_wind_table(raw, [lat_c, lon_c], [c for c in (time_c, com_c) if c])
+    # canonical lowercase schema (same as the points frame); the page reads these keys as-is
     out = pd.DataFrame({
-        "Lat": pd.to_numeric(df[lat_c], errors="coerce"),
-        "Lon": pd.to_numeric(df[lon_c], errors="coerce"),
-        "Time": df[time_c].astype(str) if time_c else "",
-        "Comments": df[com_c].astype(str) if com_c else ""
-    }).dropna(subset=["Lat", "Lon"])
-    return out
+        "lat": df[lat_c],
+        "lon": df[lon_c],
+        "time": _text_col(df[time_c]) if time_c else "",
+        "comments": _text_col(df[com_c]) if com_c else ""
+    }).dropna(subset=["lat", "lon"])
+    # when every time is resolved here the reports ship in path order (untimed last); otherwise
+    # they keep file order and the page sorts once parseTime has read the rest
+    out["t_ms"] = _report_times_ms(out["time"])
+    if not (out["t_ms"].isna() & out["time"].ne("")).any():
+        out = out.iloc[np.argsort(out["t_ms"].to_numpy(dtype=np.float64), kind="stable")]
+    return out.reset_index(drop=True)
 
 # ───────────── Parse uploads + SHOW PREVIEWS (this is what you asked to see) ─────────────
 points_df = parse_lma_dat(upl_points) if upl_points else None
@@ -181,12 +330,43 @@ with st.expander("Parsed storm/wind reports (CSV) — preview", expanded=True):
     else:
         st.info("No parsed storm/wind rows yet. Upload a CSV.")
 
-# Convert to JSON strings for injection
-def df_to_js_records(df):
-    return df.to_json(orient="records") if (df is not None and not df.empty) else "[]"
-
-points_js = df_to_js_records(points_df)
-winds_js  = df_to_js_records(winds_df)
+# Convert to column-oriented JSON ({col: [...]}) for injection; the page zips by index.
+# Columns listed in f32_cols ship as base64 little-endian float32 buffers (4 bytes/value
+# instead of ~15 chars of JSON text) and are turned into Float32Arrays by unpackColumns().
+# The result lands in a <script type="application/json"> block, so it must be strict JSON
+# (NaN -> null) and must not contain markup: "<", ">" and "&" are escaped to \u003c etc.
+# (as Django's json_script does), so "</script>" or "<!--<script>" in a comment can't
+# end the block early. JSON.parse turns the escapes back into the original characters.
+_JSON_SCRIPT_ESCAPES = str.maketrans({"<": "\\u003c", ">": "\\u003e", "&": "\\u0026"})
+
+def _b64_f32(s: pd.Series) -> str:
+    return base64.b64encode(np.ascontiguousarray(s.to_numpy(), dtype="<f4").tobytes()).decode("ascii")
+
+# Cached on key, the upload bytes the frame was parsed from: Streamlit hashes a large frame
+# from a row sample only, and the leading underscore keeps it from hashing _df at all.
+@st.cache_data(show_spinner=False, max_entries=8)
+def df_to_js_columns(key: bytes, _df, f32_cols=()):
+    if _df is None or _df.empty:
+        return "{}"
+    packed = {c: _b64_f32(_df[c]) for c in f32_cols if c in _df.columns}
+    rest = [c for c in _df.columns if c not in packed]
+    if orjson is not None:
+        cols = {c: (np.ascontiguousarray(_df[c].to_numpy()) if _df[c].dtype.kind in "fiub" else _df[c].tolist())
+                for c in rest}
+        out = orjson.dumps({**cols, **packed}, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    else:
+        cols = {c: _df[c].astype(object).where(_df[c].notna(), None).tolist() for c in rest}
+        out = json.dumps({**cols, **packed})
+    return out.translate(_JSON_SCRIPT_ESCAPES)
+
+points_js = df_to_js_columns(upl_points.getvalue() if upl_points else b"", points_df,
+                             f32_cols=("lat", "lon", "alt", "w"))
+# the raw time text rides along for reports the server left to the page's parseTime
+winds_js  = df_to_js_columns(upl_winds.getvalue() if upl_winds else b"",
+                             winds_df.assign(time=winds_df["time"].where(winds_df["t_ms"].isna(), ""))
+                             if winds_df is not None else None)
+has_points = points_df is not None and not points_df.empty
+totals_js = json.dumps(np.bincount(points_df["tier"], minlength=4).tolist() if has_points else [0, 0, 0, 0])
 
 # ─────────────────────────── HTML (no external data links) ───────────────────────────
 html_tpl = """
@@ -197,14 +377,14 @@ html_tpl = """
   <meta name="viewport" content="width=device-width, initial-scale=1.0">
   <title>Lightning Map</title>
 
-  <!-- Leaflet + plugins -->
+  <!-- Leaflet + plugins (deferred: they download in parallel and run before DOMContentLoaded) -->
+  <link rel="preconnect" href="https://unpkg.com" />
   <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-  <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+  <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js" defer></script>
   <link rel="stylesheet" href="https://unpkg.com/leaflet.markercluster@1.5.3/dist/MarkerCluster.css" />
   <link rel="stylesheet" href="https://unpkg.com/leaflet.markercluster@1.5.3/dist/MarkerCluster.Default.css" />
-  <script src="https://unpkg.com/leaflet.markercluster@1.5.3/dist/leaflet.markercluster.js"></script>
-  <script src="https://unpkg.com/leaflet.heat@0.2.0/dist/leaflet-heat.js"></script>
-  <script src="https://unpkg.com/leaflet-polylinedecorator@1.7.0/dist/leaflet.polylineDecorator.min.js"></script>
+  <script src="https://unpkg.com/leaflet.markercluster@1.5.3/dist/leaflet.markercluster.js" defer></script>
+  <script src="https://unpkg.com/leaflet-polylinedecorator@1.7.0/dist/leaflet.polylineDecorator.min.js" defer></script>
 
   <style>
     :root { --sidebar-w: 340px; }
@@ -241,11 +421,16 @@ html_tpl = """
     .footer-note { font-size: 11px; color:#666; margin-top:8px; }
   </style>
 
+  <!-- Injected from Streamlit; parsed with JSON.parse rather than as JS source -->
+  <script id="points-data" type="application/json">__POINTS__</script>
+  <script id="winds-data" type="application/json">__WINDS__</script>
+  <script id="totals-data" type="application/json">__TOTALS__</script>
   <script>
-    // Injected from Streamlit
+    const readJSON = id => JSON.parse(document.getElementById(id).textContent);
     window.INIT_DATA = {
-      points: __POINTS__,
-      winds:  __WINDS__
+      points: readJSON('points-data'),
+      winds:  readJSON('winds-data'),
+      totals: readJSON('totals-data')
     };
   </script>
 </head>
@@ -337,77 +522,114 @@ html_tpl = """
   </div>
 
   <script>
-    let map, clusterGroup, plainGroup, heatLayer, windLayer;
+    let map, pointRenderer, clusterGroup, plainGroup, heatLayer, windLayer;
     let cyclonePathLayer = null, cycloneArrowLayer = null;
-    let allMarkers = [];
-
-    function riskColor(alt){ if (alt < 12000) return '#ffe633'; if (alt < 14000) return '#ffc300'; if (alt < 16000) return '#ff5733'; return '#c70039'; }
-    function riskTier(alt){ if (alt < 12000) return 'low'; if (alt < 14000) return 'med'; if (alt < 16000) return 'high'; return 'extreme'; }
+    // points are kept column-wise: pts holds the shipped typed arrays, markers[i]/times[i]
+    // are indexed by row, and every selection below is an array of row indices
+    let pts = {}, markers = [], times = new Float64Array(0), allIdx = new Uint32Array(0), tierIndex = [];
+
+    // altitude tier index 0..3 comes precomputed from the server (np.digitize on alt)
+    const TIERS = ['low', 'med', 'high', 'extreme'];
+    const TIER_COLORS = ['#ffe633', '#ffc300', '#ff5733', '#c70039'];
+    const TIER_RADIUS = [3, 5, 7, 9];
+    const TOTALS = window.INIT_DATA.totals || [0, 0, 0, 0];
+    const ALT_RANGE_TIERS = {all: [0, 1, 2, 3], lt12: [0], '12-14': [1], '14-16': [2], gt16: [3]};
     function debounce(fn, ms){ let t; return function(){ clearTimeout(t); t = setTimeout(()=>fn.apply(this, arguments), ms); }; }
     function parseTime(val){
       if (!val) return null;
       if (!isNaN(val)) { const n=Number(val); if (n>1e10) return new Date(n); }
       const d=new Date(val); return isNaN(d.getTime())?null:d;
     }
+    function b64f32(s){
+      const b = atob(s), u = new Uint8Array(b.length);
+      for (let i = 0; i < b.length; i++) u[i] = b.charCodeAt(i);
+      return new Float32Array(u.buffer);
+    }
+    // columns shipped as base64 strings are packed float32 buffers (see df_to_js_columns)
+    function unpackColumns(cols){
+      for (const k in cols) if (typeof cols[k] === 'string') cols[k] = b64f32(cols[k]);
+      return cols;
+    }
 
     function initMap(){
-      map = L.map('map').setView([30.7, -95.2], 8);
+      // one shared <canvas> for every vector layer instead of an SVG node per marker
+      pointRenderer = L.canvas({ padding: 0.5 });
+      map = L.map('map', { preferCanvas: true, renderer: pointRenderer }).setView([30.7, -95.2], 8);
       L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', { attribution: '© OpenStreetMap contributors' }).addTo(map);
       clusterGroup = L.markerClusterGroup({ disableClusteringAtZoom: 12 });
-      plainGroup = L.layerGroup();
+      plainGroup = L.featureGroup();
+      // one delegated handler per group; popup HTML is only built for the strike clicked
+      const openStrikePopup = e=>{
+        if (e.layer.options.row === undefined) return;
+        L.popup().setLatLng(e.latlng).setContent(strikePopup(e.layer.options.row)).openOn(map);
+      };
+      clusterGroup.on('click', openStrikePopup);
+      plainGroup.on('click', openStrikePopup);
       windLayer = L.layerGroup().addTo(map);
       setTimeout(()=>{ map.invalidateSize(); }, 300);
     }
 
-    function buildPoints(rows){
-      allMarkers = []; clusterGroup.clearLayers(); plainGroup.clearLayers();
-      rows.forEach(r=>{
-        const lat = parseFloat(r.lat ?? r.Lat ?? r.latitude ?? r.Latitude);
-        const lon = parseFloat(r.lon ?? r.Lon ?? r.longitude ?? r.Longitude);
-        const alt = parseFloat(r.alt ?? r.altitude ?? r.altitude_m ?? r.Alt ?? r.Altitude);
-        const t = parseTime(r.time ?? r.Time ?? r.timestamp ?? r.Timestamp ?? r.datetime ?? r.Date);
-        if (isNaN(lat) || isNaN(lon) || isNaN(alt)) return;
-        const color = riskColor(alt), tier = riskTier(alt);
+    function strikePopup(i){
+      const t = Number.isNaN(times[i]) ? '' : `<b>Time:</b> ${new Date(times[i]).toISOString()}<br>`;
+      return `<b>Altitude:</b> ${Math.round(pts.alt[i])} m<br><b>Tier:</b> ${TIERS[pts.tier[i]].toUpperCase()}<br>` +
+        t + `(${pts.lat[i].toFixed(3)}, ${pts.lon[i].toFixed(3)})`;
+    }
+
+    function buildPoints(cols){
+      clusterGroup.clearLayers(); plainGroup.clearLayers();
+      const n = cols.lat ? cols.lat.length : 0;
+      pts = cols; markers = new Array(n); times = new Float64Array(n).fill(NaN);
+      const keep = [], buckets = TIERS.map(()=>({timed: [], untimed: []}));
+      for (let i = 0; i < n; i++){
+        const lat = cols.lat[i], lon = cols.lon[i], alt = cols.alt[i];
+        const t = cols.time ? parseTime(cols.time[i]) : null;
+        if (!Number.isFinite(lat) || !Number.isFinite(lon) || !Number.isFinite(alt)) continue;
+        const k = cols.tier[i], color = TIER_COLORS[k];
         const m = L.circleMarker([lat, lon], {
-          radius: tier==='low'?3:tier==='med'?5:tier==='high'?7:9,
+          radius: TIER_RADIUS[k], renderer: pointRenderer, row: i,
           color, fillColor: color, fillOpacity: 0.85, opacity: 1, weight: 1
-        }).bindPopup(
-          `<b>Altitude:</b> ${alt} m<br><b>Tier:</b> ${tier.toUpperCase()}<br>` +
-          (t? `<b>Time:</b> ${t.toISOString()}<br>`:'' ) + `(${lat.toFixed(3)}, ${lon.toFixed(3)})`
-        );
-        allMarkers.push({marker: m, alt, time: t, lat, lon, tier});
-      });
-      allMarkers.forEach(o=>clusterGroup.addLayer(o.marker));
-      if (!map.hasLayer(clusterGroup)) clusterGroup.addTo(map);
-      document.getElementById('sum-total').textContent = allMarkers.length;
+        });
+        markers[i] = m; keep.push(i);
+        if (t){ times[i] = t.getTime(); buckets[k].timed.push(i); } else buckets[k].untimed.push(i);
+      }
+      // per-tier buckets, timed rows sorted by time so "last N minutes" is a binary search
+      allIdx = Uint32Array.from(keep);
+      tierIndex = buckets.map(b=>({
+        timed: Uint32Array.from(b.timed).sort((a, c)=>times[a] - times[c]),
+        untimed: Uint32Array.from(b.untimed)
+      }));
+      // markers reach the map through applyFilters(), which reloadData() runs right after
+      document.getElementById('sum-total').textContent = allIdx.length;
     }
 
-    function buildWindMarkers(rows){
+    function buildWindMarkers(cols){
       windLayer.clearLayers();
+      // rows arrive in path order unless the server left some times as text (naive or
+      // date-less); those are parsed here in the browser's zone and the path is sorted once
       const seq = [];
-      rows.forEach((r, idx)=>{
-        const lat = parseFloat(r.Lat ?? r.lat ?? r.Latitude ?? r.latitude);
-        const lon = parseFloat(r.Lon ?? r.lon ?? r.Longitude ?? r.longitude);
-        const comments = r.Comments ?? r.Comment ?? r.Remark ?? r.Description ?? '';
-        const t = parseTime(r.Time ?? r.time ?? r.Date ?? r.datetime ?? r.Timestamp);
-        if (isNaN(lat) || isNaN(lon)) return;
+      let resort = false;
+      const n = cols.lat ? cols.lat.length : 0;
+      for (let idx = 0; idx < n; idx++){
+        const lat = cols.lat[idx], lon = cols.lon[idx];
+        const comments = cols.comments ? cols.comments[idx] : '';
+        const text = cols.time ? cols.time[idx] : '';
+        let t = Number.isFinite(cols.t_ms[idx]) ? new Date(cols.t_ms[idx]) : null;
+        if (!t && text){ t = parseTime(text); resort = true; }
+        if (!Number.isFinite(lat) || !Number.isFinite(lon)) continue;
         L.marker([lat, lon], {
           icon: L.divIcon({ className:'wind-icon', html:'<span style="color:blue; font-weight:700; font-size:20px;">W</span>', iconSize:[24,24], iconAnchor:[12,12] })
         }).bindPopup(
-          (t? `<b>Time:</b> ${t.toISOString()}<br>`:'') +
+          (t ? `<b>Time:</b> ${t.toISOString()}<br>` : text ? `<b>Time:</b> ${text}<br>` : '') +
           (comments ? `<b>Report:</b> ${comments}<br>`: '') +
           `(${lat.toFixed(3)}, ${lon.toFixed(3)})`
         ).addTo(windLayer);
-        seq.push({lat, lon, t, idx});
-      });
+        seq.push({lat, lon, t});
+      }
+      if (resort) seq.sort((a, b)=> !a.t || !b.t ? !a.t - !b.t : a.t - b.t);  // stable; untimed last
+      if (seq.length < 2) return;
 
-      const withTime = seq.filter(s => s.t instanceof Date && !isNaN(s.t));
-      const noTime   = seq.filter(s => !(s.t instanceof Date) || isNaN(s.t));
-      withTime.sort((a,b)=> a.t - b.t);
-      const ordered = withTime.concat(noTime);
-      if (ordered.length < 2) return;
+      const latlngs = seq.map(s => [s.lat, s.lon]);
 
-      const latlngs = ordered.map(o => [o.lat, o.lon]);
       if (cyclonePathLayer){ map.removeLayer(cyclonePathLayer); cyclonePathLayer = null; }
       if (cycloneArrowLayer){ map.removeLayer(cycloneArrowLayer); cycloneArrowLayer = null; }
 
@@ -425,4 +647,162 @@ html_tpl = """
       map.fitBounds(cyclonePathLayer.getBounds(), { padding: [20,20] });
     }
 
-    function pass
+    function lowerBound(arr, ms){
+      let lo = 0, hi = arr.length;
+      while (lo < hi){ const mid = (lo + hi) >> 1; if (times[arr[mid]] < ms) lo = mid + 1; else hi = mid; }
+      return lo;
+    }
+    // Altitude range picks whole tier buckets; the recent-minutes cutoff slices each
+    // bucket's time-sorted list (untimed strikes never pass a time filter).
+    function selectMarkers(f){
+      const cutoff = f.mins > 0 ? Date.now() - f.mins * 60000 : null;
+      const counts = {low:0, med:0, high:0, extreme:0}, parts = [];
+      (ALT_RANGE_TIERS[f.altRange] || ALT_RANGE_TIERS.all).forEach(k=>{
+        const b = tierIndex[k];
+        const timed = cutoff === null ? b.timed : b.timed.subarray(lowerBound(b.timed, cutoff));
+        parts.push(timed);
+        if (cutoff === null) parts.push(b.untimed);
+        counts[TIERS[k]] = timed.length + (cutoff === null ? b.untimed.length : 0);
+      });
+      const visible = new Uint32Array(parts.reduce((s, p)=>s + p.length, 0));
+      parts.reduce((o, p)=>{ visible.set(p, o); return o + p.length; }, 0);
+      return {visible, counts};
+    }
+    function currentFilters(){
+      return {
+        altRange: document.getElementById('altitude-filter').value,
+        mins: parseFloat(document.getElementById('recent-mins').value) || 0,
+        clusterOn: document.getElementById('cluster-toggle').value === 'on',
+        heatOn: document.getElementById('heat-toggle').value === 'on'
+      };
+    }
+
+    // leaflet.heat is only fetched the first time the heat layer is switched on
+    let heatPluginLoad = null;
+    function loadHeatPlugin(){
+      if (!heatPluginLoad) heatPluginLoad = new Promise((resolve, reject)=>{
+        const s = document.createElement('script');
+        s.src = 'https://unpkg.com/leaflet.heat@0.2.0/dist/leaflet-heat.js';
+        s.onload = resolve;
+        s.onerror = ()=>{ heatPluginLoad = null; reject(); };  // allow a retry on the next toggle
+        document.head.appendChild(s);
+      });
+      return heatPluginLoad;
+    }
+
+    // heat layer over the last filtered selection; rebuilt on its own when the plugin arrives
+    let lastVisible = null;
+    function updateHeat(){
+      if (heatLayer){ map.removeLayer(heatLayer); heatLayer = null; }
+      if (!currentFilters().heatOn || !lastVisible) return;
+      if (!L.heatLayer){ loadHeatPlugin().then(updateHeat, ()=>{}); return; }
+      if (lastVisible.length){
+        const ptsForHeat = Array.from(lastVisible, i=>[pts.lat[i], pts.lon[i], pts.w[i]]);
+        heatLayer = L.heatLayer(ptsForHeat, { radius: 18, blur: 15, maxZoom: 12 }).addTo(map);
+      }
+    }
+
+    function applyFilters(){
+      const f = currentFilters();
+      clusterGroup.clearLayers(); plainGroup.clearLayers();
+      let visible, counts;
+      if (f.altRange === 'all' && !(f.mins > 0)){
+        // nothing filtered out: tier counts are the server-side histogram
+        visible = allIdx;
+        counts = {low: TOTALS[0], med: TOTALS[1], high: TOTALS[2], extreme: TOTALS[3]};
+      } else {
+        ({visible, counts} = selectMarkers(f));
+      }
+
+      if (f.clusterOn){
+        if (map.hasLayer(plainGroup)) map.removeLayer(plainGroup);
+        // one bulk insert: markercluster clusters the batch once instead of per marker
+        clusterGroup.addLayers(Array.from(visible, i=>markers[i]));
+        if (!map.hasLayer(clusterGroup)) clusterGroup.addTo(map);
+      } else {
+        if (map.hasLayer(clusterGroup)) map.removeLayer(clusterGroup);
+        visible.forEach(i=>plainGroup.addLayer(markers[i]));
+        if (!map.hasLayer(plainGroup)) plainGroup.addTo(map);
+      }
+
+      lastVisible = visible;
+      updateHeat();
+
+      document.getElementById('sum-visible').textContent = visible.length;
+      document.getElementById('sum-low').textContent = counts.low;
+      document.getElementById('sum-med').textContent = counts.med;
+      document.getElementById('sum-high').textContent = counts.high;
+      document.getElementById('sum-extreme').textContent = counts.extreme;
+    }
+
+    function applyPathToggles(){
+      const showPath = document.getElementById('path-toggle').value === 'on';
+      const showArrows = document.getElementById('arrows-toggle').value === 'on';
+      if (cyclonePathLayer){ if (showPath) cyclonePathLayer.addTo(map); else map.removeLayer(cyclonePathLayer); }
+      if (cycloneArrowLayer){ if (showPath && showArrows) cycloneArrowLayer.addTo(map); else map.removeLayer(cycloneArrowLayer); }
+    }
+
+    function downloadCSV(){
+      const f = currentFilters();
+      // one string per line; Blob concatenates the parts without building a giant joined string
+      const parts = ["lat,lon,altitude_m,tier,time_iso\\n"];
+      selectMarkers(f).visible.sort().forEach(i=>{  // typed-array sort is numeric: upload order
+        const t = Number.isNaN(times[i]) ? '' : new Date(times[i]).toISOString();
+        // 5 decimals: a 6th would print float32 noise (see the downcast in _parse_lma_dat_bytes)
+        parts.push(`${pts.lat[i].toFixed(5)},${pts.lon[i].toFixed(5)},${pts.alt[i].toFixed(1)},${TIERS[pts.tier[i]]},${t}\\n`);
+      });
+      const blob = new Blob(parts, {type:'text/csv'});
+      const a = document.createElement('a');
+      a.href = URL.createObjectURL(blob); a.download = 'filtered_points.csv';
+      document.body.appendChild(a); a.click(); a.remove();
+      setTimeout(()=>URL.revokeObjectURL(a.href), 1000);
+    }
+
+    function reloadData(){
+      buildPoints(unpackColumns(window.INIT_DATA.points || {}));
+      buildWindMarkers(window.INIT_DATA.winds || {});
+      applyPathToggles();
+      applyFilters();
+    }
+
+    // Coalesce filter changes: at most one applyFilters per animation frame.
+    let applyPending = false;
+    function scheduleApply(){
+      if (applyPending) return;
+      applyPending = true;
+      requestAnimationFrame(()=>{ applyPending = false; applyFilters(); });
+    }
+    // the Leaflet scripts are deferred, so L exists only once the document has been parsed
+    document.addEventListener('DOMContentLoaded', ()=>{
+      initMap();
+      reloadData();
+      document.getElementById('altitude-filter').addEventListener('change', scheduleApply);
+      document.getElementById('recent-mins').addEventListener('input', debounce(scheduleApply, 150));
+      document.getElementById('cluster-toggle').addEventListener('change', scheduleApply);
+      document.getElementById('heat-toggle').addEventListener('change', scheduleApply);
+      document.getElementById('path-toggle').addEventListener('change', applyPathToggles);
+      document.getElementById('arrows-toggle').addEventListener('change', applyPathToggles);
+      document.getElementById('download-points').addEventListener('click', downloadCSV);
+    });
+  </script>
+</body>
+</html>
+"""
+
+# The template is constant; split it around its data slots once per process
+# so each rerun is a single join instead of chained .replace passes.
+_SLOTS = ("__POINTS__", "__WINDS__", "__TOTALS__")
+
+@st.cache_resource(show_spinner=False)
+def _html_template_parts(tpl: str) -> tuple[str, ...]:
+    parts = []
+    for slot in _SLOTS:
+        head, tpl = tpl.split(slot, 1)
+        parts.append(head)
+    return (*parts, tpl)
+
+_parts = _html_template_parts(html_tpl)
+_page = [_parts[0]]
+for _data, _part in zip((points_js, winds_js, totals_js), _parts[1:]):
+    _page += (_data, _part)
+st_html("".join(_page), height=860, scrolling=False)
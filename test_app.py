@@ -0,0 +1,28 @@
+import pandas as pd
+
+import app
+
+
+def test_report_times_us_zone_abbreviations():
+    ms = app._report_times_ms(pd.Series(["2024-07-08 10:00 CDT", "2024-07-08 10:00 CST", "Jul 8 2024 08:00 cdt"]))
+    # the same instants the browser's Date gives for these strings
+    assert ms.tolist() == [1720450800000, 1720454400000, 1720443600000]
+
+
+def test_report_times_leave_naive_and_hhmm_to_the_page():
+    ms = app._report_times_ms(pd.Series(["2024-07-08 10:00", "1200", "", "garbage", "1720483200000"]))
+    assert ms.iloc[:4].isna().all()
+    assert ms.iloc[4] == 1720483200000
+
+
+def test_wind_csv_sorted_when_every_time_resolves():
+    raw = b"Lat,Lon,Time\n29.5,-95.5,2024-07-08 12:00 CDT\n29.1,-95.1,2024-07-08 10:00 CST\n29.2,-95.2,\n"
+    df = app._parse_wind_csv_bytes(raw)
+    assert df["lat"].tolist() == [29.1, 29.5, 29.2]
+
+
+def test_wind_csv_keeps_file_order_for_page_parsed_times():
+    raw = b"Lat,Lon,Time\n29.5,-95.5,2024-07-08 12:00 CDT\n29.1,-95.1,2024-07-08 10:00\n"
+    df = app._parse_wind_csv_bytes(raw)
+    assert df["lat"].tolist() == [29.5, 29.1]
+    assert df["time"].tolist() == ["2024-07-08 12:00 CDT", "2024-07-08 10:00"]